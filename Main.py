@@ -1,16 +1,33 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Extra, ValidationError
 from typing import List, Optional
+from collections import defaultdict
 from datetime import datetime
+import math
+import orjson
+import os
+import time
 import uvicorn
 
-# Initialize FastAPI app
+# Initialize FastAPI app (OpenAPI schema and docs are disabled in production)
+IS_PRODUCTION = os.getenv("ENV") == "production"
+
 app = FastAPI(
     title="StoreBuddy API",
     description="AI-powered retail management system",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    docs_url=None if IS_PRODUCTION else "/docs",
+    redoc_url=None if IS_PRODUCTION else "/redoc",
+    openapi_url=None if IS_PRODUCTION else "/openapi.json"
 )
 
+# Compress large JSON payloads (product/customer lists, reports)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Data Models
 class Product(BaseModel):
     id: int
@@ -20,16 +37,33 @@ class Product(BaseModel):
     quantity: int
     category: Optional[str] = "General"
 
+    class Config:
+        extra = Extra.forbid
+        validate_assignment = False
+
 class Customer(BaseModel):
     id: int
     name: str
     phone: Optional[str] = None
     loyalty_points: int = 0
 
+    class Config:
+        extra = Extra.forbid
+        validate_assignment = False
+
 class BillItem(BaseModel):
     product_id: int
     quantity: int
 
+    # Immutable value object, hashable for caching
+    class Config:
+        extra = Extra.forbid
+        frozen = True
+
+# Bill request body, validated once its raw JSON bytes are decoded with orjson
+class BillItemList(BaseModel):
+    __root__: List[BillItem]
+
 class Bill(BaseModel):
     bill_id: int
     items: List[BillItem]
@@ -39,121 +73,203 @@ class Bill(BaseModel):
     total: float
     timestamp: datetime
 
-# In-memory storage
-products_db = []
-customers_db = []
+    class Config:
+        extra = Extra.forbid
+        validate_assignment = False
+
+# In-memory storage (indexed by id for O(1) lookups)
+products_by_id: dict[int, Product] = {}
+customers_by_id: dict[int, Customer] = {}
 bills_db = []
 bill_counter = 0
 
-# Root endpoint
+# Running per-day sales totals, updated as bills are created
+daily_sales_by_date = defaultdict(lambda: {"total": 0.0, "count": 0, "bills": []})
+
+# Stock indexes: ids of products at or near zero quantity
+LOW_STOCK_THRESHOLD = 10
+low_stock_ids: set[int] = set()
+out_of_stock_ids: set[int] = set()
+
+def reindex_stock(product):
+    if product.quantity < LOW_STOCK_THRESHOLD:
+        low_stock_ids.add(product.id)
+    else:
+        low_stock_ids.discard(product.id)
+    if product.quantity == 0:
+        out_of_stock_ids.add(product.id)
+    else:
+        out_of_stock_ids.discard(product.id)
+
+# Report cache: serialized bodies are reused until a write bumps the version
+data_version = 0
+report_cache: dict[str, tuple[int, object, bytes]] = {}
+
+def invalidate_reports():
+    global data_version
+    data_version += 1
+
+def cached_report(name, key, build):
+    cached = report_cache.get(name)
+    if cached is None or cached[0] != data_version or cached[1] != key:
+        cached = (data_version, key, orjson.dumps(build()))
+        report_cache[name] = cached
+    return Response(content=cached[2], media_type="application/json")
+
+# Root endpoint (constant body, serialized once at import)
+ROOT_BODY = orjson.dumps({
+    "message": "Welcome to StoreBuddy API!",
+    "version": "1.0.0",
+    "status": "running"
+})
+
 @app.get("/")
-def read_root():
-    return {
-        "message": "Welcome to StoreBuddy API!",
-        "version": "1.0.0",
-        "status": "running"
-    }
+async def read_root():
+    return Response(content=ROOT_BODY, media_type="application/json")
 
 # Health check
 @app.get("/health")
-def health_check():
-    return {"status": "healthy", "timestamp": datetime.now()}
+async def health_check():
+    return {"status": "healthy", "timestamp": time.time()}
 
 # PRODUCT ENDPOINTS
-@app.get("/products", response_model=List[Product])
-def get_all_products():
-    return products_db
-
-@app.post("/products", response_model=Product)
-def add_product(product: Product):
-    # Check if product ID already exists
-    for existing_product in products_db:
-        if existing_product.id == product.id:
-            raise HTTPException(status_code=400, detail="Product ID already exists")
+PRODUCT_STREAM_BATCH = 500
+
+async def iter_products_json(products):
+    # Encode the JSON array in batches instead of buffering the whole catalog
+    yield b"["
+    for start in range(0, len(products), PRODUCT_STREAM_BATCH):
+        chunk = b",".join(orjson.dumps(p.dict()) for p in products[start:start + PRODUCT_STREAM_BATCH])
+        yield chunk if start == 0 else b"," + chunk
+    yield b"]"
+
+@app.get("/products", responses={200: {"model": List[Product]}})
+async def get_all_products():
+    # Snapshot the references so writes between chunks can't break iteration
+    products = list(products_by_id.values())
+    return StreamingResponse(iter_products_json(products), media_type="application/json")
+
+@app.post("/products", status_code=201, responses={201: {"model": Product}})
+async def add_product(product: Product):
+    # Insert unless the product ID already exists (single dict lookup)
+    if products_by_id.setdefault(product.id, product) is not product:
+        raise HTTPException(status_code=400, detail="Product ID already exists")
     
-    products_db.append(product)
-    return product
+    reindex_stock(product)
+    invalidate_reports()
+    return ORJSONResponse(product.dict(), status_code=201)
 
 @app.get("/products/{product_id}", response_model=Product)
-def get_product(product_id: int):
-    for product in products_db:
-        if product.id == product_id:
-            return product
-    raise HTTPException(status_code=404, detail="Product not found")
+async def get_product(product_id: int):
+    product = products_by_id.get(product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
 
 @app.put("/products/{product_id}", response_model=Product)
-def update_product(product_id: int, updated_product: Product):
-    for i, product in enumerate(products_db):
-        if product.id == product_id:
-            updated_product.id = product_id
-            products_db[i] = updated_product
-            return updated_product
-    raise HTTPException(status_code=404, detail="Product not found")
+async def update_product(product_id: int, updated_product: Product):
+    product = products_by_id.get(product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    # Both sides are already validated, so copy without re-running validators
+    product = product.copy(update=updated_product.dict(exclude_unset=True, exclude={"id"}))
+    products_by_id[product_id] = product
+    reindex_stock(product)
+    invalidate_reports()
+    return product
 
 @app.delete("/products/{product_id}")
-def delete_product(product_id: int):
-    for i, product in enumerate(products_db):
-        if product.id == product_id:
-            del products_db[i]
-            return {"message": "Product deleted successfully"}
-    raise HTTPException(status_code=404, detail="Product not found")
+async def delete_product(product_id: int):
+    if product_id not in products_by_id:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    del products_by_id[product_id]
+    low_stock_ids.discard(product_id)
+    out_of_stock_ids.discard(product_id)
+    invalidate_reports()
+    return {"message": "Product deleted successfully"}
 
 # CUSTOMER ENDPOINTS
-@app.get("/customers", response_model=List[Customer])
-def get_all_customers():
-    return customers_db
-
-@app.post("/customers", response_model=Customer)
-def add_customer(customer: Customer):
-    # Check if customer ID already exists
-    for existing_customer in customers_db:
-        if existing_customer.id == customer.id:
-            raise HTTPException(status_code=400, detail="Customer ID already exists")
+@app.get("/customers", responses={200: {"model": List[Customer]}})
+async def get_all_customers():
+    return ORJSONResponse([c.dict() for c in customers_by_id.values()])
+
+@app.post("/customers", status_code=201, responses={201: {"model": Customer}})
+async def add_customer(customer: Customer):
+    # Insert unless the customer ID already exists (single dict lookup)
+    if customers_by_id.setdefault(customer.id, customer) is not customer:
+        raise HTTPException(status_code=400, detail="Customer ID already exists")
     
-    customers_db.append(customer)
-    return customer
+    return ORJSONResponse(customer.dict(), status_code=201)
 
 # BILLING ENDPOINTS
-@app.post("/bill", response_model=dict)
-def create_bill(items: List[BillItem], customer_id: Optional[int] = None):
-    global bill_counter
-    bill_counter += 1
+def parse_bill_items(body):
+    # Mirror FastAPI's own 422 errors for missing and malformed JSON bodies
+    if not body:
+        raise RequestValidationError([{"loc": ("body",), "msg": "field required", "type": "value_error.missing"}])
+    try:
+        json_body = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise RequestValidationError([{
+            "type": "json_invalid",
+            "loc": ("body", e.pos),
+            "msg": "JSON decode error",
+            "input": {},
+            "ctx": {"error": e.msg}
+        }])
     
-    subtotal = 0.0
-    bill_items_processed = []
+    try:
+        return BillItemList.parse_obj(json_body).__root__
+    except ValidationError as e:
+        errors = [{**error, "loc": ("body",) + error["loc"][1:]} for error in e.errors()]
+        raise RequestValidationError(errors)
+
+@app.post("/bill", openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"type": "array", "items": BillItem.schema()}}}
+    }
+})
+async def create_bill(request: Request, customer_id: Optional[int] = None):
+    global bill_counter
+    items = parse_bill_items(await request.body())
     
-    # Process each item
+    # Coalesce repeated lines so each product is looked up and updated once
+    quantity_by_id = defaultdict(int)
     for item in items:
-        # Find the product
-        product = None
-        for p in products_db:
-            if p.id == item.product_id:
-                product = p
-                break
-        
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Product ID {item.product_id} not found")
+        quantity_by_id[item.product_id] += item.quantity
+    
+    # Pass 1: resolve and validate every product before touching inventory
+    resolved = []
+    for product_id, quantity in quantity_by_id.items():
+        product = products_by_id.get(product_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail=f"Product ID {product_id} not found")
         
-        if product.quantity < item.quantity:
+        if product.quantity < quantity:
             raise HTTPException(
                 status_code=400, 
-                detail=f"Insufficient stock for {product.name}. Available: {product.quantity}, Requested: {item.quantity}"
+                detail=f"Insufficient stock for {product.name}. Available: {product.quantity}, Requested: {quantity}"
             )
+        resolved.append((product, quantity))
+    
+    # Sum in one C-level pass, without accumulating float rounding error
+    subtotal = math.fsum(product.price * quantity for product, quantity in resolved)
+    
+    # Pass 2: update inventory and track processed items
+    bill_counter += 1
+    bill_items_processed = []
+    for product, quantity in resolved:
+        product.quantity -= quantity
+        reindex_stock(product)
         
-        # Calculate item total
-        item_total = product.price * item.quantity
-        subtotal += item_total
-        
-        # Update inventory
-        product.quantity -= item.quantity
-        
-        # Track processed item
         bill_items_processed.append({
             "product_id": product.id,
             "product_name": product.name,
-            "quantity": item.quantity,
+            "quantity": quantity,
             "unit_price": product.price,
-            "item_total": item_total
+            "item_total": product.price * quantity
         })
     
     # Calculate GST (18%)
@@ -161,6 +277,7 @@ def create_bill(items: List[BillItem], customer_id: Optional[int] = None):
     total = round(subtotal + gst_amount, 2)
     
     # Create bill record
+    now = datetime.now()
     bill_record = {
         "bill_id": bill_counter,
         "customer_id": customer_id,
@@ -168,72 +285,95 @@ def create_bill(items: List[BillItem], customer_id: Optional[int] = None):
         "subtotal": subtotal,
         "gst_amount": gst_amount,
         "total": total,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now
     }
     
     bills_db.append(bill_record)
+    daily_sales = daily_sales_by_date[now.date()]
+    daily_sales["total"] += total
+    daily_sales["count"] += 1
+    daily_sales["bills"].append(bill_record)
+    invalidate_reports()
     
-    return {
+    return ORJSONResponse({
         "success": True,
         "bill": bill_record,
         "message": f"Bill #{bill_counter} created successfully"
-    }
+    })
 
 # REPORTS ENDPOINTS
 @app.get("/reports/daily-sales")
-def get_daily_sales():
+async def get_daily_sales():
     today = datetime.now().date()
-    daily_bills = [
-        bill for bill in bills_db 
-        if datetime.fromisoformat(bill["timestamp"]).date() == today
-    ]
-    
-    total_sales = sum(bill["total"] for bill in daily_bills)
-    total_bills = len(daily_bills)
+    return cached_report("daily-sales", today, lambda: build_daily_sales(today))
+
+def build_daily_sales(today):
+    daily_sales = daily_sales_by_date.get(today)
+    if daily_sales is None:
+        return {"date": today.isoformat(), "total_bills": 0, "total_sales": 0, "bills": []}
     
     return {
         "date": today.isoformat(),
-        "total_bills": total_bills,
-        "total_sales": total_sales,
-        "bills": daily_bills
+        "total_bills": daily_sales["count"],
+        "total_sales": daily_sales["total"],
+        "bills": daily_sales["bills"]
     }
 
 @app.get("/reports/inventory-status")
-def get_inventory_status():
-    low_stock_products = [p for p in products_db if p.quantity < 10]
-    out_of_stock = [p for p in products_db if p.quantity == 0]
-    
+async def get_inventory_status():
+    return cached_report("inventory-status", None, build_inventory_status)
+
+def build_inventory_status():
     return {
-        "total_products": len(products_db),
-        "low_stock_items": len(low_stock_products),
-        "out_of_stock_items": len(out_of_stock),
-        "low_stock_products": low_stock_products,
-        "out_of_stock_products": out_of_stock
+        "total_products": len(products_by_id),
+        "low_stock_items": len(low_stock_ids),
+        "out_of_stock_items": len(out_of_stock_ids),
+        "low_stock_products": [products_by_id[i].dict() for i in low_stock_ids],
+        "out_of_stock_products": [products_by_id[i].dict() for i in out_of_stock_ids]
     }
 
-# AI FEATURES (Placeholders)
+# AI FEATURES (Placeholders, constant bodies serialized once at import)
+AI_MARKETING_BODY = orjson.dumps({
+    "message": "AI Marketing feature",
+    "suggestions": [
+        "Promote Festival Sale for top 5 products",
+        "Send loyalty offers to customers with 100+ points",
+        "Create social media post for new arrivals"
+    ]
+})
+
+AI_DEMAND_FORECAST_BODY = orjson.dumps({
+    "message": "AI Demand Forecasting",
+    "predictions": [
+        {"product_id": 1, "predicted_demand": 25, "confidence": 85},
+        {"product_id": 2, "predicted_demand": 18, "confidence": 78}
+    ]
+})
+
 @app.get("/ai/marketing")
-def ai_marketing():
-    return {
-        "message": "AI Marketing feature",
-        "suggestions": [
-            "Promote Festival Sale for top 5 products",
-            "Send loyalty offers to customers with 100+ points",
-            "Create social media post for new arrivals"
-        ]
-    }
+async def ai_marketing():
+    return Response(content=AI_MARKETING_BODY, media_type="application/json")
 
 @app.get("/ai/demand-forecast")
-def demand_forecast():
-    return {
-        "message": "AI Demand Forecasting",
-        "predictions": [
-            {"product_id": 1, "predicted_demand": 25, "confidence": 85},
-            {"product_id": 2, "predicted_demand": 18, "confidence": 78}
-        ]
-    }
+async def demand_forecast():
+    return Response(content=AI_DEMAND_FORECAST_BODY, media_type="application/json")
 
 # Run the application
+# WORKERS > 1 runs one process per worker (e.g. WORKERS=$(nproc)), or use
+#   gunicorn Main:app -w $(nproc) -k uvicorn.workers.UvicornWorker --worker-connections 1000 --backlog 2048
+# NOTE: the in-memory stores above are per process, so multiple workers
+# require moving them to a shared store (e.g. Redis) first.
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    workers = int(os.getenv("WORKERS", "1"))
+    # Multiple workers need an import string; a single worker takes the app
+    # object directly, since "Main:app" would import this file a second time
+    uvicorn.run(
+        "Main:app" if workers > 1 else app,
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=workers,
+        app_dir=os.path.dirname(os.path.abspath(__file__))
+    )
     